@@ -0,0 +1,79 @@
+"""Thin client for a code_analyzer.py server started with --serve SOCKET.
+
+Usage: python analyzer_client.py SOCKET file_or_directory [options]
+
+The arguments after SOCKET are passed to the server unchanged, and the output
+is the same as running code_analyzer.py with them in the current directory.
+"""
+import os
+import socket
+import struct
+import sys
+
+LENGTH = struct.Struct(">I")
+STDOUT = b"o"
+STDERR = b"e"
+EXIT = b"x"
+
+
+def read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ConnectionError("connection closed by the server")
+    return data
+
+
+def write_request(stream, arguments):
+    stream.write(LENGTH.pack(len(arguments)))
+    for argument in arguments:
+        data = os.fsencode(argument)
+        stream.write(LENGTH.pack(len(data)) + data)
+    stream.flush()
+
+
+def read_request(stream):
+    count, = LENGTH.unpack(read_exactly(stream, LENGTH.size))
+    arguments = []
+    for _ in range(count):
+        length, = LENGTH.unpack(read_exactly(stream, LENGTH.size))
+        arguments.append(os.fsdecode(read_exactly(stream, length)))
+    return arguments
+
+
+def write_frame(stream, channel, data):
+    stream.write(channel + LENGTH.pack(len(data)) + data)
+    stream.flush()
+
+
+def read_frames(stream):
+    while True:
+        channel = read_exactly(stream, 1)
+        length, = LENGTH.unpack(read_exactly(stream, LENGTH.size))
+        yield channel, read_exactly(stream, length)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        sys.stderr.write(__doc__.split("\n\n")[1] + "\n")
+        return 2
+    socket_path, *arguments = argv
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        stream = connection.makefile("rwb")
+        write_request(stream, [os.getcwd(), sys.stdout.encoding,
+                               sys.stderr.encoding, *arguments])
+        for channel, data in read_frames(stream):
+            if channel == STDOUT:
+                sys.stdout.buffer.write(data)
+            elif channel == STDERR:
+                sys.stdout.flush()
+                sys.stderr.buffer.write(data)
+                sys.stderr.flush()
+            elif channel == EXIT:
+                sys.stdout.flush()
+                return int(data)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
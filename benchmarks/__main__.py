@@ -0,0 +1,132 @@
+"""Time the phases and checks of StaticCodeAnalyzer on a synthetic corpus.
+
+Run from the repository root with ``python -m benchmarks [options]``. Each
+measurement is repeated and reported as the mean and standard deviation of
+the time for the whole corpus, together with the throughput in lines and
+files per second.
+"""
+import argparse
+import ast
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.corpus import generate_corpus
+from code_analyzer import RULES, NodeChecker, StaticCodeAnalyzer
+
+LINE_CHECKS = (
+    StaticCodeAnalyzer.too_long,
+    StaticCodeAnalyzer.indentation,
+    StaticCodeAnalyzer.semicolon,
+    StaticCodeAnalyzer.space_before_inline_comment,
+    StaticCodeAnalyzer.todo_found,
+    StaticCodeAnalyzer.space_after_construction,
+)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--comment-density", type=float, default=0.2)
+    parser.add_argument("--string-density", type=float, default=0.2)
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument("--functions", type=int, default=20)
+    parser.add_argument("--nesting", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def bare_analyzer(path, code):
+    analyzer = StaticCodeAnalyzer.__new__(StaticCodeAnalyzer)
+    analyzer.path = path
+    analyzer.code = code
+    analyzer.profiler = None
+    analyzer.rules = set(RULES)
+    analyzer.records = []
+    analyzer.node_errors = defaultdict(list)
+    return analyzer
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmarks(corpus):
+    trees = [ast.parse(code) for _, code in corpus]
+    prepared = []
+    for _, code in corpus:
+        lines = {i: line.rstrip() for i, line in enumerate(code.splitlines(), 1)}
+        contexts = StaticCodeAnalyzer.line_contexts(code, lines)
+        prepared.append([(line, contexts[number])
+                         for number, line in lines.items() if line])
+
+    def analyze():
+        for path, code in corpus:
+            StaticCodeAnalyzer(path, code)
+
+    def node_methods():
+        for path, code in corpus:
+            bare_analyzer(path, code).node_methods()
+
+    def line_methods():
+        for path, code in corpus:
+            bare_analyzer(path, code).line_methods()
+
+    def parse():
+        for _, code in corpus:
+            ast.parse(code)
+
+    def node_checker():
+        for tree in trees:
+            NodeChecker(defaultdict(list)).visit(tree)
+
+    def line_contexts():
+        for _, code in corpus:
+            lines = {i: line.rstrip()
+                     for i, line in enumerate(code.splitlines(), 1)}
+            StaticCodeAnalyzer.line_contexts(code, lines)
+
+    yield "StaticCodeAnalyzer", analyze
+    yield "node_methods", node_methods
+    yield "  ast.parse", parse
+    yield "  NodeChecker", node_checker
+    yield "line_methods", line_methods
+    yield "  line_contexts", line_contexts
+    for check in LINE_CHECKS:
+        def run_check(check=check):
+            for lines in prepared:
+                for line, context in lines:
+                    check(line, context)
+        yield f"  {check.__name__}", run_check
+
+
+def main():
+    args = parse_arguments()
+    corpus = generate_corpus(
+        files=args.files, seed=args.seed, lines=args.lines,
+        comment_density=args.comment_density,
+        string_density=args.string_density, classes=args.classes,
+        functions=args.functions, nesting=args.nesting,
+    )
+    total_lines = sum(len(code.splitlines()) for _, code in corpus)
+    print(f"{len(corpus)} files, {total_lines} lines, "
+          f"{args.repeat} repetitions")
+    print(f"{'benchmark':<30} {'mean ms':>10} {'stdev ms':>10} "
+          f"{'lines/s':>12} {'files/s':>10}")
+    for name, function in benchmarks(corpus):
+        timings = measure(function, args.repeat)
+        mean = statistics.mean(timings)
+        stdev = statistics.stdev(timings) if len(timings) > 1 else 0.0
+        print(f"{name:<30} {mean * 1e3:>10.2f} {stdev * 1e3:>10.2f} "
+              f"{total_lines / mean:>12.0f} {len(corpus) / mean:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
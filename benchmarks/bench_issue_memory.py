@@ -0,0 +1,72 @@
+"""Measure the memory used per issue by the different issue representations.
+
+Run from the repository root with ``python -m benchmarks.bench_issue_memory
+[count]``. EagerIssue reproduces the former Issue class, which formatted its
+message in __init__ and kept a list slice and an instance dictionary.
+"""
+import sys
+import tracemalloc
+
+from code_analyzer import Issue, IssueTable
+
+PATHS = 1000
+NAMES = 5000
+
+
+class EagerIssue:
+    def __init__(self, path_to_file, line_number, message):
+        self.path_to_file = path_to_file
+        self.line_number = line_number
+        self.error_code = message[0]
+        self.construction_name = message[1:]
+        self.error_message = Issue.error_codes[self.error_code].format(
+            *self.construction_name
+        )
+
+
+def records(count):
+    paths = [f"src/package_{i % 37}/module_{i}.py" for i in range(PATHS)]
+    names = [f"SomeName{i}" for i in range(NAMES)]
+    for index in range(count):
+        path = paths[index % PATHS]
+        if index % 3:
+            yield path, index % 2000 + 1, ["S011", names[index % NAMES]]
+        else:
+            yield path, index % 2000 + 1, ["S001"]
+
+
+def measure(label, build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    issues = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{label:<24} {(after - before) / count:>10.1f} bytes/issue")
+    return issues
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    def eager(count):
+        return [EagerIssue(f"{path}", line, list(message))
+                for path, line, message in records(count)]
+
+    def lazy(count):
+        return [Issue(f"{path}", line, message)
+                for path, line, message in records(count)]
+
+    def table(count):
+        issues = IssueTable()
+        for path, line, message in records(count):
+            issues.append(f"{path}", line, message)
+        return issues
+
+    print(f"{count} issues")
+    measure("eager Issue (before)", eager, count)
+    measure("Issue with __slots__", lazy, count)
+    measure("IssueTable", table, count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Time the AST checks on deeply nested functions.
+
+Run from the repository root with ``python -m benchmarks.bench_nesting``.
+The time per node should stay flat as the nesting depth grows.
+"""
+import ast
+import timeit
+from collections import defaultdict
+
+from code_analyzer import NodeChecker
+
+DEPTHS = (5, 10, 20, 40, 80)
+ASSIGNMENTS_PER_FUNCTION = 20
+REPEAT = 5
+
+
+def nested_functions(depth, assignments):
+    lines = []
+    for level in range(depth):
+        indent = "    " * level
+        lines.append(f"{indent}def function_{level}(argument_{level}):")
+        lines.extend(f"{indent}    Value_{level}_{i} = {i}"
+                     for i in range(assignments))
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    print(f"{'depth':>5} {'nodes':>8} {'best ms':>9} {'us/node':>8}")
+    for depth in DEPTHS:
+        tree = ast.parse(nested_functions(depth, ASSIGNMENTS_PER_FUNCTION))
+        nodes = sum(1 for _ in ast.walk(tree))
+        best = min(timeit.repeat(
+            lambda: NodeChecker(defaultdict(list)).visit(tree),
+            number=1, repeat=REPEAT,
+        ))
+        print(f"{depth:>5} {nodes:>8} {best * 1e3:>9.2f} "
+              f"{best / nodes * 1e6:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
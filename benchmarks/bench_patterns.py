@@ -0,0 +1,67 @@
+"""Compare compiling rule patterns per call with the shared PATTERNS registry.
+
+Run from the repository root with ``python -m benchmarks.bench_patterns``.
+Each case runs the same match over a 100k-line corpus, once through
+``re.compile`` at the call site (as the checks used to do) and once through
+the precompiled pattern.
+"""
+import re
+import timeit
+
+from code_analyzer import PATTERNS
+
+LINES = 100_000
+REPEAT = 5
+
+
+def corpus(lines):
+    templates = (
+        "def function_{0}(argument, other_{0}):",
+        "    value_{0} = compute(argument) + {0}",
+        "class Thing{0}:",
+        "    # a comment about item {0}",
+        "    return 'text {0}' + \"more\"",
+    )
+    return [templates[i % len(templates)].format(i) for i in range(lines)]
+
+
+def identifiers(lines):
+    prefixes = ("value", "CamelName", "__dunder__", "x")
+    return [f"{prefixes[i % len(prefixes)]}_{i}" for i in range(lines)]
+
+
+def best_of(function):
+    return min(timeit.repeat(function, number=1, repeat=REPEAT))
+
+
+def compare(label, pattern, method, items):
+    source = PATTERNS[pattern].pattern
+    compiled = getattr(PATTERNS[pattern], method)
+
+    def per_call():
+        for item in items:
+            getattr(re.compile(source), method)(item)
+
+    def registry():
+        for item in items:
+            compiled(item)
+
+    before, after = best_of(per_call), best_of(registry)
+    print(f"{label:<28} {before * 1e9 / len(items):>9.1f} "
+          f"{after * 1e9 / len(items):>9.1f} "
+          f"{(before - after) * 1e9 / len(items):>9.1f}")
+
+
+def main():
+    lines = corpus(LINES)
+    names = identifiers(LINES)
+    print(f"{'ns per item':<28} {'compile':>9} {'registry':>9} {'saved':>9}")
+    compare("construction (per line)", "construction", "match", lines)
+    compare("comment or string (per line)", "comment_or_string", "match",
+            lines)
+    compare("snake_case (per identifier)", "snake_case", "search", names)
+    compare("camel_case (per identifier)", "camel_case", "match", names)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Check that the comment and string scanner stays linear on adversarial lines.
+
+Run from the repository root with ``python -m benchmarks.bench_scanner``.
+Every case builds lines of growing length from a repeated fragment (quotes,
+escapes and ``#`` in the combinations that made the former
+``find_comment`` loop forever or backtrack) and times
+``StaticCodeAnalyzer.find_comment`` and ``line_contexts`` on them. The
+exit status is 1 if the time per character of the longest line exceeds
+``MAX_GROWTH`` times that of the shortest one.
+"""
+import sys
+import timeit
+
+from code_analyzer import StaticCodeAnalyzer
+
+SIZES = (1_000, 10_000, 100_000)
+MAX_GROWTH = 4
+REPEAT = 5
+
+CASES = {
+    "hash in string": ('x = "a#b#c"', ""),
+    "hashes": ("#", ""),
+    "spaces then hash": (" ", "#"),
+    "double quotes": ('"', ""),
+    "single quotes": ("'", ""),
+    "triple quotes": ('"""', ""),
+    "quote hash": ('"#', ""),
+    "mixed quotes": ("'#\"", ""),
+    "escaped quotes": ('\\"', ""),
+    "backslashes": ("\\", ""),
+    "string of backslashes": ('"' + "\\" * 3, ""),
+    "open triple with escapes": ('a\\', '"""'),
+    "open triple with pairs": ('"" ', '"""'),
+    "empty strings then hash": ("''", "#"),
+    "escaped quote hash": ("\\'#", "'"),
+}
+
+
+def line(fragment, prefix, size):
+    return prefix + fragment * (size // len(fragment))
+
+
+def best_of(function):
+    return min(timeit.repeat(function, number=1, repeat=REPEAT))
+
+
+def per_character(function, text):
+    return best_of(lambda: function(text)) / len(text)
+
+
+def main():
+    scanners = {
+        "find_comment": StaticCodeAnalyzer.find_comment,
+        "line_contexts": lambda text: StaticCodeAnalyzer.line_contexts(
+            text, {1: text}
+        ),
+    }
+    print(f"{'case':<28} {'scanner':<14}"
+          + "".join(f"{f'ns/char {size}':>16}" for size in SIZES)
+          + f"{'growth':>8}")
+    failed = False
+    for label, (fragment, prefix) in CASES.items():
+        for name, scanner in scanners.items():
+            timings = [per_character(scanner, line(fragment, prefix, size))
+                       for size in SIZES]
+            growth = timings[-1] / timings[0]
+            failed |= growth > MAX_GROWTH
+            print(f"{label:<28} {name:<14}"
+                  + "".join(f"{timing * 1e9:>16.1f}" for timing in timings)
+                  + f"{growth:>8.1f}" + ("  FAILED" if growth > MAX_GROWTH else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
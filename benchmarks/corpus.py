@@ -0,0 +1,93 @@
+"""Deterministic generator of synthetic Python sources for the benchmarks.
+
+Every rule from S001 to S012 is triggered now and then, and the same
+arguments always produce the same text.
+"""
+import random
+
+KEYWORDS = ("value", "total", "item", "result", "count", "name", "index")
+
+
+class SourceGenerator:
+    def __init__(self, seed=0, comment_density=0.2, string_density=0.2):
+        self.random = random.Random(seed)
+        self.comment_density = comment_density
+        self.string_density = string_density
+        self.lines = []
+
+    def name(self, snake_case=True):
+        words = self.random.sample(KEYWORDS, 2)
+        if snake_case or self.random.random() < 0.8:
+            return "_".join(words) + str(self.random.randrange(100))
+        return "".join(word.title() for word in words)
+
+    def comment(self):
+        text = self.random.choice(("explain the value", "TODO tidy up",
+                                   "see the docs; twice", "note # nested"))
+        spaces = "  " if self.random.random() < 0.9 else " "
+        return f"{spaces}# {text}"
+
+    def value(self):
+        if self.random.random() < self.string_density:
+            text = self.random.choice(("plain", "with # hash", "semi;colon",
+                                       "escaped \\\" quote"))
+            return f'"{text}"' if self.random.random() < 0.5 else f"'{text}'"
+        return str(self.random.randrange(1000))
+
+    def statement(self, indent):
+        line = f"{'    ' * indent}{self.name(snake_case=False)} = {self.value()}"
+        if self.random.random() < 0.1:
+            line += f" + {self.value()} + {self.value()} + {self.value()}"
+        if self.random.random() < 0.03:
+            line += ";"
+        if self.random.random() < 0.02:
+            line += f" + (\n{'    ' * indent}   {self.value()})"
+        if self.random.random() < self.comment_density:
+            line += self.comment()
+        self.lines.extend(line.split("\n"))
+
+    def blank(self):
+        self.lines.extend([""] * self.random.choice((1, 1, 2, 3)))
+
+    def function(self, indent, depth, body):
+        spaces = "  " if self.random.random() < 0.05 else " "
+        default = "[]" if self.random.random() < 0.1 else "None"
+        self.lines.append(
+            f"{'    ' * indent}def{spaces}{self.name(snake_case=False)}"
+            f"(self_or_first, {self.name(snake_case=False)}={default}):"
+        )
+        for _ in range(max(body, 1)):
+            self.statement(indent + 1)
+        if depth > 0:
+            self.function(indent + 1, depth - 1, body)
+        self.lines.append(f"{'    ' * (indent + 1)}return None")
+
+    def klass(self, body, nesting):
+        name = self.name(snake_case=self.random.random() < 0.2)
+        self.lines.append(f"class {name[0].upper()}{name[1:]}:")
+        self.lines.append('    """Docstring with a # and a; in it.')
+        self.lines.append('    """')
+        self.statement(1)
+        self.function(1, nesting, body)
+
+
+def generate_source(seed=0, lines=1000, comment_density=0.2,
+                    string_density=0.2, classes=5, functions=20, nesting=2):
+    generator = SourceGenerator(seed, comment_density, string_density)
+    blocks = ["class"] * classes + ["function"] * functions
+    generator.random.shuffle(blocks)
+    body = max(lines // max(len(blocks), 1) // (nesting + 1) - 2, 1)
+    for block in blocks:
+        if block == "class":
+            generator.klass(body, nesting)
+        else:
+            generator.function(0, nesting, body)
+        generator.blank()
+    while len(generator.lines) < lines:
+        generator.statement(0)
+    return "\n".join(generator.lines) + "\n"
+
+
+def generate_corpus(files=10, seed=0, **options):
+    return [(f"generated_{index}.py", generate_source(seed + index, **options))
+            for index in range(files)]
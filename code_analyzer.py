@@ -3,98 +3,151 @@ import argparse
 import os
 import sys
 import ast
-from collections import defaultdict
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import select
+import signal
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+import analyzer_client
+
+numpy = None
+
+__version__ = "1.1.0"
+
+BATCH_SIZE = 16
+CACHE_SIZE = 64
+OUTPUT_BUFFER = 1024 * 1024
+READ_AHEAD_MEMORY = 64
+INPUT_CHUNK = 64 * 1024
+TIMEOUT = 60
+MTIME_RESOLUTION = 2 * 10 ** 9
+WATCH_DEBOUNCE = 0.02
+WATCH_POLL_INTERVAL = 0.5
+
+PATTERNS = {
+    "camel_case": re.compile("([A-Z][a-z]*)+$"),
+    "snake_case": re.compile("^_{0,2}[a-z][a-z0-9]*(_[a-z0-9]+)*(__)?$"),
+    "construction": re.compile(" *(def|class) "),
+    "hunk": re.compile(r"@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@"),
+    "comment_or_string": re.compile(r"""
+        [^#'"]*
+        (?:
+        (?P<comment>\#[^\r\n]*)
+        | (?P<string>
+        \"\"\"[^"\\]*(?:(?:\\(?:.|\Z)|"(?!""))[^"\\]*)*(?:\"\"\"|\Z)
+        | \'\'\'[^'\\]*(?:(?:\\(?:.|\Z)|'(?!''))[^'\\]*)*(?:\'\'\'|\Z)
+        | "[^"\\\r\n]*(?:\\(?:\r\n|.)[^"\\\r\n]*)*"?
+        | '[^'\\\r\n]*(?:\\(?:\r\n|.)[^'\\\r\n]*)*'?
+        )
+        | \Z
+        )
+    """, re.VERBOSE | re.DOTALL),
+    "indent_bytes": re.compile(rb" *"),
+    "non_ascii_bytes": re.compile(rb"[^\x00-\x7f]"),
+    "lone_carriage_return": re.compile(rb"\r(?!\n)"),
+}
+
+LineContext = namedtuple("LineContext", ["comment", "code_end", "strings"])
 
 
 class StaticCodeAnalyzer:
-    def __init__(self, path, code):
+    def __init__(self, path, code, profiler=None, rules=None):
         self.code = code
         self.path = path
-        self.issues = []
+        self.profiler = profiler
+        self.rules = set(RULES if rules is None else rules)
+        self.records = []
         self.node_errors = defaultdict(list)
         self.node_methods()
         self.line_methods()
 
+    @property
+    def issues(self):
+        issues = IssueTable()
+        issues.extend(self.path, self.records)
+        return issues
+
+    @property
+    def analyzer(self):
+        return analyzer_for(AnalysisOptions(rules=tuple(self.rules)))
+
     def node_methods(self):
-        tree = ast.parse(self.code)
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                class_name = node.name
-                camel_case_template = re.compile("([A-Z][a-z]*)+$")
-                if not camel_case_template.match(class_name):
-                    self.node_errors[node.lineno].append(["S008", class_name])
-            elif isinstance(node, ast.FunctionDef):
-                function_name = node.name
-                if StaticCodeAnalyzer.is_not_snake_case(function_name):
-                    self.node_errors[node.lineno].append(["S009", function_name])
-                argument_names = [argument.arg for argument in node.args.args]
-                for name in argument_names:
-                    if StaticCodeAnalyzer.is_not_snake_case(name):
-                        self.node_errors[node.lineno].append(["S010", name])
-                for default in node.args.defaults:
-                    if not isinstance(default, ast.Constant):
-                        self.node_errors[node.lineno].append(["S012"])
-                        break
-                variables_in_function = set()
-                for statement in ast.walk(node):
-                    if isinstance(statement, ast.Assign):
-                        variables = []
-                        for target in statement.targets:
-                            try:
-                                variable_name = target.id
-                            except AttributeError:
-                                pass
-                            else:
-                                variables.append(variable_name)
-                        for name in variables:
-                            if name not in variables_in_function:
-                                variables_in_function.add(name)
-                                if StaticCodeAnalyzer.is_not_snake_case(name):
-                                    self.node_errors[statement.lineno].append(
-                                        ["S011", name]
-                                    )
+        self.node_errors.update(
+            self.analyzer.node_errors(self.code, self.profiler)
+        )
 
     def line_methods(self):
-        lines = {i: line.rstrip() for i, line in enumerate(self.code.splitlines(), 1)}
-        blank_line_counter = 0
-        for line_number, line in lines.items():
-            if line:
-                line_errors = []
-                for method in (StaticCodeAnalyzer.too_long,
-                               StaticCodeAnalyzer.indentation,
-                               StaticCodeAnalyzer.semicolon,
-                               StaticCodeAnalyzer.space_before_inline_comment,
-                               StaticCodeAnalyzer.todo_found,
-                               StaticCodeAnalyzer.space_after_construction,
-                               ):
-                    found_error, *error = method(line)
-                    if found_error:
-                        line_errors.append(error)
-                if blank_line_counter > 2:
-                    line_errors.append(["S006"])
-                blank_line_counter = 0
-                for error in line_errors + self.node_errors[line_number]:
-                    self.issues.append(Issue(self.path, line_number, error))
-            else:
-                blank_line_counter += 1
+        with timing(self.profiler, "line rules"):
+            self.check_lines()
+
+    def check_lines(self):
+        self.records.extend(self.analyzer.line_records(
+            self.code, self.node_errors, self.profiler
+        ))
 
     @staticmethod
-    def find_string(line):
-        single_quote = re.search("'.*'", line)
-        double_quote = re.search('".*"', line)
-        return single_quote or double_quote
+    def line_contexts(code, lines):
+        line_starts = [0]
+        for line in code.splitlines(keepends=True):
+            line_starts.append(line_starts[-1] + len(line))
+        comments = {}
+        strings = defaultdict(list)
+        for token in PATTERNS["comment_or_string"].finditer(code):
+            if token.lastgroup is None:
+                continue
+            start, end = token.span(token.lastgroup)
+            row = bisect_right(line_starts, start)
+            if token.lastgroup == "comment":
+                comments[row] = start - line_starts[row - 1]
+                continue
+            last_row = bisect_right(line_starts, end - 1)
+            for line_number in range(row, last_row + 1):
+                line_start = line_starts[line_number - 1]
+                strings[line_number].append((
+                    max(start - line_start, 0),
+                    min(end - line_start, len(lines[line_number])),
+                ))
+        contexts = {line_number: LineContext(-1, len(line), ())
+                    for line_number, line in lines.items()}
+        for line_number, spans in strings.items():
+            contexts[line_number] = contexts[line_number]._replace(strings=tuple(spans))
+        for line_number, comment in comments.items():
+            line = lines[line_number]
+            contexts[line_number] = contexts[line_number]._replace(
+                comment=comment, code_end=len(line[:comment].rstrip())
+            )
+        return contexts
+
+    @staticmethod
+    def line_context(line):
+        comment = -1
+        strings = []
+        for token in PATTERNS["comment_or_string"].finditer(line):
+            if token.lastgroup == "comment":
+                comment = token.start("comment")
+            elif token.lastgroup == "string":
+                strings.append(token.span("string"))
+        if comment < 0:
+            return LineContext(-1, len(line), tuple(strings))
+        return LineContext(comment, len(line[:comment].rstrip()), tuple(strings))
 
     @staticmethod
     def find_comment(line):
-        comment = line.find('#')
-        while comment > -1:
-            string = StaticCodeAnalyzer.find_string(line)
-            if not string:
-                return comment
-            if comment < string.start() or string.end() < comment:
-                return comment
-            comment = line[comment + 1:].find('#')
-        return comment
+        return StaticCodeAnalyzer.line_context(line).comment
 
     @staticmethod
     def remove_comment(line):
@@ -104,13 +157,13 @@ class StaticCodeAnalyzer:
         return line[:comment_start].rstrip()
 
     @staticmethod
-    def too_long(line):
+    def too_long(line, context=None):
         if len(line) >= 80:
             return True, "S001"
         return False,
 
     @staticmethod
-    def indentation(line):
+    def indentation(line, context=None):
         count = 0
         while line[count] == " ":
             count += 1
@@ -119,32 +172,33 @@ class StaticCodeAnalyzer:
         return False,
 
     @staticmethod
-    def semicolon(line):
-        code = StaticCodeAnalyzer.remove_comment(line)
+    def semicolon(line, context=None):
+        comment, code_end, strings = context or StaticCodeAnalyzer.line_context(line)
+        code = line[:code_end].rstrip()
         if code.endswith(";"):
-            return True, "S003"
+            semicolon_index = len(code) - 1
+            if not any(start <= semicolon_index < end for start, end in strings):
+                return True, "S003"
         return False,
 
     @staticmethod
-    def space_before_inline_comment(line):
-        comment = StaticCodeAnalyzer.find_comment(line)
+    def space_before_inline_comment(line, context=None):
+        comment = (context or StaticCodeAnalyzer.line_context(line)).comment
         if comment > 1:
             if line[comment - 2: comment] != "  ":
                 return True, "S004"
         return False,
 
     @staticmethod
-    def todo_found(line):
-        if '#' in line:
-            comment_index = line.index('#')
-            if "todo" in line[comment_index:].lower():
-                return True, "S005"
+    def todo_found(line, context=None):
+        comment = (context or StaticCodeAnalyzer.line_context(line)).comment
+        if comment > -1 and "todo" in line[comment:].lower():
+            return True, "S005"
         return False,
 
     @staticmethod
-    def space_after_construction(line):
-        construction_name = re.compile(" *(def|class) ")
-        construction_found = construction_name.match(line)
+    def space_after_construction(line, context=None):
+        construction_found = PATTERNS["construction"].match(line)
         if construction_found:
             try:
                 character_after = line[construction_found.end()]
@@ -157,11 +211,238 @@ class StaticCodeAnalyzer:
 
     @staticmethod
     def is_not_snake_case(name):
-        snake_case_template = re.compile("^_{0,2}[a-z][a-z0-9]*(_[a-z0-9]+)*(__)?$")
-        return not snake_case_template.search(name)
+        return not PATTERNS["snake_case"].search(name)
+
+
+class NodeChecker(ast.NodeVisitor):
+    def __init__(self, node_errors, profiler=None, rules=None):
+        self.node_errors = node_errors
+        self.scopes = []
+        checks = {}
+        for code in AST_RULES.intersection(RULES if rules is None else rules):
+            rule = RULES[code]
+            check = getattr(self, rule.check)
+            if profiler is not None:
+                check = profiler.timed(code, check)
+            checks[rule.check] = check
+        self.class_checks = self.enabled(checks, "check_class_name")
+        self.function_checks = self.enabled(
+            checks, "check_function_name", "check_argument_names",
+            "check_default_arguments",
+        )
+        self.assign_checks = self.enabled(checks, "check_variable_names")
+
+    @staticmethod
+    def enabled(checks, *names):
+        return tuple(checks[name] for name in names if name in checks)
+
+    def visit_ClassDef(self, node):
+        for check in self.class_checks:
+            check(node)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        for check in self.function_checks:
+            check(node)
+        self.scopes.append(set())
+        self.generic_visit(node)
+        self.scopes.pop()
+
+    def visit_Assign(self, node):
+        if self.scopes:
+            for check in self.assign_checks:
+                check(node)
+        self.generic_visit(node)
+
+    def check_class_name(self, node):
+        class_name = node.name
+        if not PATTERNS["camel_case"].match(class_name):
+            self.node_errors[node.lineno].append(["S008", class_name])
+
+    def check_function_name(self, node):
+        function_name = node.name
+        if StaticCodeAnalyzer.is_not_snake_case(function_name):
+            self.node_errors[node.lineno].append(["S009", function_name])
+
+    def check_argument_names(self, node):
+        argument_names = [argument.arg for argument in node.args.args]
+        for name in argument_names:
+            if StaticCodeAnalyzer.is_not_snake_case(name):
+                self.node_errors[node.lineno].append(["S010", name])
+
+    def check_default_arguments(self, node):
+        for default in node.args.defaults:
+            if not isinstance(default, ast.Constant):
+                self.node_errors[node.lineno].append(["S012"])
+                break
+
+    def check_variable_names(self, node):
+        variables_in_function = self.scopes[-1]
+        for target in node.targets:
+            try:
+                name = target.id
+            except AttributeError:
+                continue
+            if name not in variables_in_function:
+                variables_in_function.add(name)
+                if StaticCodeAnalyzer.is_not_snake_case(name):
+                    self.node_errors[node.lineno].append(["S011", name])
+
+
+class MappedLineChecker:
+    checked_rules = {"S001", "S002", "S003", "S006"}
+    unmapped_bytes = (b"\x0b", b"\x0c", b"\x1c", b"\x1d", b"\x1e", b"\x1f",
+                      b"\xc2\x85", b"\xe2\x80\xa8", b"\xe2\x80\xa9")
+
+    def __init__(self, data, rules, code=None):
+        self.data = data
+        self.rules = rules
+        self.code = code
+        self.records = []
+        with memoryview(data) as view:
+            self.check_lines(view)
+
+    @staticmethod
+    def supported(data):
+        if any(data.find(sequence) > -1
+               for sequence in MappedLineChecker.unmapped_bytes):
+            return False
+        return not PATTERNS["lone_carriage_return"].search(data)
+
+    @staticmethod
+    def decode_line(view, start, end):
+        try:
+            return str(view[start:end], "utf-8")
+        except UnicodeDecodeError as error:
+            raise UnicodeDecodeError(
+                error.encoding, error.object, start + error.start,
+                start + error.end, error.reason,
+            ) from None
+
+    def semicolon_contexts(self):
+        if self.code is None:
+            self.code = str(self.data, "utf-8")
+        lines = {i: line.rstrip()
+                 for i, line in enumerate(self.code.splitlines(), 1)}
+        return lines, StaticCodeAnalyzer.line_contexts(self.code, lines)
+
+    def check_lines(self, view):
+        data = self.data
+        too_long = "S001" in self.rules
+        indentation = "S002" in self.rules
+        semicolon = "S003" in self.rules and data.find(b";") > -1
+        blank_lines = "S006" in self.rules
+        if semicolon:
+            lines, contexts = self.semicolon_contexts()
+        indent = PATTERNS["indent_bytes"]
+        non_ascii = PATTERNS["non_ascii_bytes"]
+        ascii_only = not non_ascii.search(data)
+        size = len(data)
+        start = 0
+        line_number = 0
+        blank_line_counter = 0
+        while start < size:
+            end = data.find(b"\n", start)
+            if end < 0:
+                end = size
+            line_number += 1
+            if ascii_only or not non_ascii.search(data, start, end):
+                stop = end
+                while stop > start and data[stop - 1] in b" \t\r":
+                    stop -= 1
+                length = stop - start
+                spaces = indent.match(data, start, stop).end() - start
+            else:
+                line = self.decode_line(view, start, end).rstrip()
+                length = len(line)
+                spaces = length - len(line.lstrip(" "))
+            if not length:
+                blank_line_counter += 1
+                start = end + 1
+                continue
+            if too_long and length >= 80:
+                self.records.append((line_number, "S001"))
+            if indentation and spaces % 4:
+                self.records.append((line_number, "S002"))
+            if semicolon and data.find(b";", start, end) > -1:
+                found_error, *error = StaticCodeAnalyzer.semicolon(
+                    lines[line_number], contexts[line_number]
+                )
+                if found_error:
+                    self.records.append((line_number, *error))
+            if blank_lines and blank_line_counter > 2:
+                self.records.append((line_number, "S006"))
+            blank_line_counter = 0
+            start = end + 1
+
+
+class VectorLineChecker(MappedLineChecker):
+    checked_rules = {"S001", "S002", "S006"}
+
+    @staticmethod
+    def supported(data):
+        global numpy
+        if numpy is None:
+            try:
+                import numpy
+            except ImportError:
+                numpy = False
+        return numpy is not False and MappedLineChecker.supported(data)
+
+    def check_lines(self, view):
+        data = numpy.frombuffer(view, numpy.uint8)
+        size = len(data)
+        if not size:
+            return
+        newlines = numpy.flatnonzero(data == ord("\n"))
+        starts = numpy.concatenate(([0], newlines + 1))
+        ends = numpy.concatenate((newlines, [size]))
+        if starts[-1] == size:
+            starts, ends = starts[:-1], ends[:-1]
+        visible = numpy.flatnonzero(
+            (data != ord(" ")) & (data != ord("\t"))
+            & (data != ord("\r")) & (data != ord("\n"))
+        )
+        last = numpy.searchsorted(visible, ends) - 1
+        stops = numpy.append(visible, -1)[last] + 1
+        stops = numpy.maximum(stops, starts)
+        lengths = stops - starts
+        not_space = numpy.flatnonzero(data != ord(" "))
+        first = numpy.searchsorted(not_space, starts)
+        first = numpy.append(not_space, size)[first]
+        spaces = numpy.minimum(first, stops) - starts
+        non_ascii = numpy.flatnonzero(data >= 0x80)
+        for index in numpy.unique(numpy.searchsorted(starts, non_ascii,
+                                                     "right") - 1):
+            line = self.decode_line(view, int(starts[index]),
+                                    int(ends[index])).rstrip()
+            lengths[index] = len(line)
+            spaces[index] = len(line) - len(line.lstrip(" "))
+        lines = numpy.flatnonzero(lengths)
+        blank_lines = numpy.diff(lines, prepend=-1) - 1
+        lengths = lengths[lines]
+        spaces = spaces[lines]
+        errors = []
+        if "S001" in self.rules:
+            errors.append(("S001", lengths >= 80))
+        if "S002" in self.rules:
+            errors.append(("S002", spaces % 4 != 0))
+        if "S006" in self.rules:
+            errors.append(("S006", blank_lines > 2))
+        if not errors:
+            return
+        any_error = numpy.logical_or.reduce([found for _, found in errors])
+        for index in numpy.flatnonzero(any_error).tolist():
+            line_number = int(lines[index]) + 1
+            for code, found in errors:
+                if found[index]:
+                    self.records.append((line_number, code))
 
 
 class Issue:
+    __slots__ = ("path_to_file", "line_number", "error_code",
+                 "construction_name")
+
     error_codes = {"S001": "Too long",
                    "S002": "Indentation is not a multiple of four",
                    "S003": "Unnecessary semicolon",
@@ -174,37 +455,764 @@ class Issue:
                    "S010": "Argument name '{}' should be snake_case",
                    "S011": "Variable '{}' in function should be snake_case",
                    "S012": "Default argument value is mutable",
+                   "E001": "Syntax error: {}",
+                   "E002": "Analysis stopped after {} seconds",
+                   "E003": "File is not valid UTF-8: {}",
+                   "E004": "File could not be read: {}",
+                   "E005": "Analysis failed: {}",
+                   "E006": "Invalid input record: {}",
                    }
 
     def __init__(self, path_to_file, line_number, message):
+        if isinstance(path_to_file, str):
+            path_to_file = sys.intern(path_to_file)
         self.path_to_file = path_to_file
         self.line_number = line_number
         self.error_code = message[0]
-        self.construction_name = message[1:]
-        self.error_message = self.error_codes[self.error_code].format(*self.construction_name)
+        self.construction_name = tuple(message[1:])
+
+    @property
+    def error_message(self):
+        return self.error_codes[self.error_code].format(*self.construction_name)
 
     def __repr__(self):
         return f"{self.path_to_file}: Line {self.line_number}: {self.error_code} {self.error_message}"
 
 
-def get_filenames():
+class IssueTable:
+    def __init__(self):
+        self.paths = []
+        self.path_ids = {}
+        self.codes = list(Issue.error_codes)
+        self.code_ids = {code: index for index, code in enumerate(self.codes)}
+        self.names = [None]
+        self.name_ids = {}
+        self.path_column = array("I")
+        self.line_column = array("I")
+        self.code_column = array("B")
+        self.name_column = array("I")
+
+    @staticmethod
+    def intern(value, values, value_ids):
+        try:
+            return value_ids[value]
+        except KeyError:
+            value_ids[value] = len(values)
+            values.append(value)
+            return value_ids[value]
+
+    def append(self, path_to_file, line_number, message):
+        self.path_column.append(
+            self.intern(path_to_file, self.paths, self.path_ids)
+        )
+        self.line_column.append(line_number)
+        self.code_column.append(self.code_ids[message[0]])
+        self.name_column.append(
+            self.intern(message[1], self.names, self.name_ids)
+            if len(message) > 1 else 0
+        )
+
+    def extend(self, path_to_file, records):
+        for line_number, *message in records:
+            self.append(path_to_file, line_number, message)
+
+    def __len__(self):
+        return len(self.line_column)
+
+    def __getitem__(self, index):
+        name = self.names[self.name_column[index]]
+        return Issue(self.paths[self.path_column[index]],
+                     self.line_column[index],
+                     (self.codes[self.code_column[index]],)
+                     + (() if name is None else (name,)))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+Rule = namedtuple("Rule", ["code", "kind", "check"])
+
+RULES = {
+    "S001": Rule("S001", "line", StaticCodeAnalyzer.too_long),
+    "S002": Rule("S002", "line", StaticCodeAnalyzer.indentation),
+    "S003": Rule("S003", "line", StaticCodeAnalyzer.semicolon),
+    "S004": Rule("S004", "line", StaticCodeAnalyzer.space_before_inline_comment),
+    "S005": Rule("S005", "line", StaticCodeAnalyzer.todo_found),
+    "S006": Rule("S006", "blank lines", None),
+    "S007": Rule("S007", "line", StaticCodeAnalyzer.space_after_construction),
+    "S008": Rule("S008", "ast", "check_class_name"),
+    "S009": Rule("S009", "ast", "check_function_name"),
+    "S010": Rule("S010", "ast", "check_argument_names"),
+    "S011": Rule("S011", "ast", "check_variable_names"),
+    "S012": Rule("S012", "ast", "check_default_arguments"),
+}
+RULE_CODES = tuple(RULES)
+AST_RULES = {code for code, rule in RULES.items() if rule.kind == "ast"}
+CONTEXT_RULES = {"S003", "S004", "S005"}
+TRANSIENT_ERRORS = {"E002", "E005"}
+FILE_ERRORS = {"E001", "E002", "E003", "E004", "E005"}
+RECORD_ORDER = {code: rank for rank, code in enumerate(
+    ("S001", "S002", "S003", "S004", "S005", "S007", "S006")
+)}
+ENGINES = {
+    "python": None,
+    "mmap": MappedLineChecker,
+    "numpy": VectorLineChecker,
+}
+
+
+def select_rules(select=None, ignore=None):
+    def matching(prefixes):
+        codes = set()
+        for prefix in prefixes:
+            matches = {code for code in RULES if code.startswith(prefix)}
+            if not prefix or not matches:
+                raise ValueError(f"unknown rule code {prefix!r}")
+            codes |= matches
+        return codes
+
+    selected = matching(select) if select else set(RULES)
+    ignored = matching(ignore) if ignore else set()
+    return tuple(code for code in RULES if code in selected - ignored)
+
+
+AnalysisOptions = namedtuple(
+    "AnalysisOptions",
+    ["cache", "rules", "profile", "fingerprint", "engine", "timeout"],
+    defaults=(None, RULE_CODES, False, False, "python", None),
+)
+
+FileResult = namedtuple(
+    "FileResult",
+    ["filename", "records", "cached", "digest", "stat", "profile",
+     "fingerprints"],
+    defaults=(None, None, None, None),
+)
+
+
+class Analyzer:
+    def __init__(self, options=AnalysisOptions()):
+        self.options = options
+        self.rules = frozenset(options.rules)
+        self.line_rules = tuple(rule for code, rule in RULES.items()
+                                if code in self.rules and rule.kind == "line")
+        self.line_checks = tuple(rule.check for rule in self.line_rules)
+        self.blank_lines = "S006" in self.rules
+        self.needs_contexts = bool(self.rules & CONTEXT_RULES)
+        self.needs_tree = bool(self.rules & AST_RULES)
+        self.line_checker = ENGINES[options.engine]
+        self.mapped_rules = frozenset()
+        if self.line_checker is not None:
+            self.mapped_rules = self.line_checker.checked_rules & self.rules
+        self.subsets = {}
+
+    def subset(self, rules, engine="python"):
+        key = (frozenset(rules), engine)
+        analyzer = self.subsets.get(key)
+        if analyzer is None:
+            options = self.options._replace(
+                rules=tuple(code for code in RULES if code in key[0]),
+                engine=engine,
+            )
+            analyzer = self.subsets.setdefault(key, Analyzer(options))
+        return analyzer
+
+    def node_errors(self, code, profiler=None):
+        node_errors = defaultdict(list)
+        if not self.needs_tree:
+            return node_errors
+        with timing(profiler, "parse"):
+            try:
+                tree = ast.parse(code)
+            except ValueError as error:
+                raise SyntaxError(str(error)) from None
+        with timing(profiler, "ast rules"):
+            NodeChecker(node_errors, profiler, self.rules).visit(tree)
+        return node_errors
+
+    def line_records(self, code, node_errors, profiler=None):
+        if profiler is None:
+            methods = self.line_checks
+        else:
+            methods = tuple(profiler.timed(rule.code, rule.check)
+                            for rule in self.line_rules)
+        lines = {i: line.rstrip() for i, line in enumerate(code.splitlines(), 1)}
+        contexts = {}
+        if self.needs_contexts:
+            contexts = StaticCodeAnalyzer.line_contexts(code, lines)
+        records = []
+        blank_line_counter = 0
+        for line_number, line in lines.items():
+            if line:
+                context = contexts.get(line_number)
+                line_errors = []
+                for method in methods:
+                    found_error, *error = method(line, context)
+                    if found_error:
+                        line_errors.append(error)
+                if self.blank_lines and blank_line_counter > 2:
+                    line_errors.append(["S006"])
+                blank_line_counter = 0
+                for error in line_errors + node_errors.get(line_number, []):
+                    records.append((line_number, *error))
+            else:
+                blank_line_counter += 1
+        return records
+
+    def check_code(self, code, profiler=None):
+        node_errors = self.node_errors(code, profiler)
+        with timing(profiler, "line rules"):
+            return self.line_records(code, node_errors, profiler)
+
+    def check_source(self, data, profiler=None):
+        mapped = frozenset()
+        if (self.mapped_rules and not isinstance(data, str)
+                and self.line_checker.supported(data)):
+            mapped = self.mapped_rules
+        analyzer = self.subset(self.rules - mapped) if mapped else self
+        code = None
+        records = []
+        if analyzer.rules or not mapped:
+            if isinstance(data, str):
+                code = data
+            else:
+                with timing(profiler, "decode"):
+                    code = str(data, "utf-8")
+            records = analyzer.check_code(code, profiler)
+        if mapped:
+            with timing(profiler, f"{self.options.engine} rules"):
+                checker = self.line_checker(data, mapped, code)
+                records = sorted(checker.records + records, key=lambda record: (
+                    record[0], RECORD_ORDER.get(record[1], len(RECORD_ORDER))
+                ))
+            code = checker.code
+        return code, records
+
+    def check_isolated(self, data, profiler=None):
+        timeout = self.options.timeout
+        try:
+            code, records = self.subset(
+                self.rules - AST_RULES, self.options.engine
+            ).check_source(data, profiler)
+            if code is None and self.needs_tree:
+                with timing(profiler, "decode"):
+                    code = str(data, "utf-8")
+        except UnicodeDecodeError as error:
+            line_number = bytes(data[:error.start]).count(b"\n") + 1
+            return None, [(line_number, "E003", error.reason)]
+        except Exception as error:
+            return None, [(1, "E005", f"{type(error).__name__}: {error}")]
+        if not self.needs_tree:
+            return code, records
+        try:
+            with time_limit(timeout):
+                node_errors = self.node_errors(code, profiler)
+        except AnalysisTimeout:
+            failure = (1, "E002", f"{timeout:g}")
+        except SyntaxError as error:
+            failure = (max(error.lineno or 1, 1), "E001", error.msg)
+        except Exception as error:
+            failure = (1, "E005", f"{type(error).__name__}: {error}")
+        else:
+            records += [(line_number, *error)
+                        for line_number, errors in node_errors.items()
+                        for error in errors]
+            return code, sorted(records, key=lambda record: record[0])
+        return code, sorted([failure, *records], key=lambda record: record[0])
+
+    def analyze(self, path, source):
+        issues = IssueTable()
+        issues.extend(path, self.check_isolated(source)[1])
+        return iter(issues)
+
+    def analyze_many(self, sources):
+        for path, source in sources:
+            yield path, list(self.analyze(path, source))
+
+
+ANALYZERS = {}
+
+
+def analyzer_for(options):
+    key = (frozenset(options.rules), options.engine, options.timeout)
+    analyzer = ANALYZERS.get(key)
+    if analyzer is None:
+        analyzer = ANALYZERS.setdefault(key, Analyzer(options))
+    return analyzer
+
+
+class Profiler:
+    def __init__(self):
+        self.calls = Counter()
+        self.seconds = defaultdict(float)
+
+    def add(self, name, seconds, calls=1):
+        self.calls[name] += calls
+        self.seconds[name] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name, function):
+        def timed_function(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return timed_function
+
+    def merge(self, other):
+        for name, seconds in other.seconds.items():
+            self.add(name, seconds, other.calls[name])
+
+    def report(self, output_format="table"):
+        rows = sorted(self.seconds.items(), key=lambda item: -item[1])
+        rules = [(name, seconds) for name, seconds in rows
+                 if name in Issue.error_codes]
+        phases = [(name, seconds) for name, seconds in rows
+                  if name not in Issue.error_codes]
+        if output_format == "json":
+            return json.dumps({
+                kind: {name: {"calls": self.calls[name], "seconds": seconds}
+                       for name, seconds in entries}
+                for kind, entries in (("phases", phases), ("rules", rules))
+            }, indent=2) + "\n"
+        lines = []
+        for kind, entries in (("phase", phases), ("rule", rules)):
+            if not entries:
+                continue
+            lines.append(f"{kind:<12} {'calls':>10} {'total ms':>12} "
+                         f"{'us/call':>10}")
+            lines.extend(f"{name:<12} {self.calls[name]:>10} "
+                         f"{seconds * 1e3:>12.2f} "
+                         f"{seconds / self.calls[name] * 1e6:>10.2f}"
+                         for name, seconds in entries)
+            lines.append("")
+        return "\n".join(lines)
+
+
+def timing(profiler, name):
+    if profiler is None:
+        return nullcontext()
+    return profiler.phase(name)
+
+
+class AnalysisTimeout(Exception):
+    pass
+
+
+@contextmanager
+def time_limit(seconds):
+    if (not seconds or not hasattr(signal, "setitimer")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise AnalysisTimeout(seconds)
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class ResultCache:
+    def __init__(self, directory, rules=RULE_CODES, max_size=CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size * 1024 * 1024
+        self.salt = f"{__version__}:{','.join(sorted(rules))}:".encode()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def digest(data):
+        return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+    def entry_path(self, digest):
+        key = hashlib.blake2b(self.salt + digest.encode(), digest_size=20)
+        return os.path.join(self.directory, key.hexdigest() + ".json")
+
+    def get(self, digest):
+        path = self.entry_path(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as entry:
+                records = [tuple(record) for record in json.load(entry)]
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return records
+
+    def put(self, digest, records):
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory,
+                                                 suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as entry:
+                json.dump(records, entry, separators=(",", ":"))
+            os.replace(temporary, self.entry_path(digest))
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scanner:
+            for entry in scanner:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def statistics(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        return f"cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time_ns()
+        try:
+            with open(path, "r", encoding="utf-8") as manifest:
+                self.files = json.load(manifest)
+        except (OSError, ValueError):
+            self.files = {}
+
+    @staticmethod
+    def stat_key(stat):
+        return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+    def unchanged(self, filename, stat):
+        entry = self.files.get(os.path.abspath(filename))
+        if entry is None:
+            return None
+        *stat_key, digest, checked = entry
+        if stat_key != self.stat_key(stat):
+            return None
+        if stat.st_mtime_ns >= checked - MTIME_RESOLUTION:
+            return None
+        return digest
+
+    def update(self, filename, stat, digest):
+        self.files[os.path.abspath(filename)] = [*stat, digest, self.started]
+
+    def save(self):
+        directory = os.path.dirname(self.path) or "."
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as manifest:
+                json.dump(self.files, manifest, separators=(",", ":"))
+            os.replace(temporary, self.path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+
+class Baseline:
+    MAGIC = b"code_analyzer baseline 1\n"
+
+    def __init__(self, path=None):
+        self.fingerprints = set()
+        if path is None:
+            return
+        try:
+            with open(path, "rb") as baseline:
+                data = baseline.read()
+        except OSError as error:
+            sys.stderr.write(f"{path}: {error.strerror}\n")
+            sys.exit()
+        fingerprints = array("Q")
+        if (not data.startswith(self.MAGIC)
+                or (len(data) - len(self.MAGIC)) % fingerprints.itemsize):
+            sys.stderr.write(f"{path} is not a baseline file.\n")
+            sys.exit()
+        fingerprints.frombytes(data[len(self.MAGIC):])
+        if sys.byteorder != "little":
+            fingerprints.byteswap()
+        self.fingerprints = set(fingerprints)
+
+    @staticmethod
+    def fingerprint(filename, records, code):
+        path = os.path.normpath(filename).replace(os.sep, "/")
+        lines = code.splitlines()
+        occurrences = Counter()
+        fingerprints = []
+        for line_number, *error in records:
+            line = lines[line_number - 1] if line_number <= len(lines) else ""
+            key = "\0".join((path, *error, " ".join(line.split())))
+            occurrences[key] += 1
+            key = f"{key}\0{occurrences[key]}".encode("utf-8", "surrogatepass")
+            fingerprints.append(int.from_bytes(
+                hashlib.blake2b(key, digest_size=8).digest(), "little"
+            ))
+        return fingerprints
+
+    def new_records(self, records, fingerprints):
+        return [record for record, fingerprint in zip(records, fingerprints)
+                if fingerprint not in self.fingerprints]
+
+    def add(self, fingerprints):
+        self.fingerprints.update(fingerprints)
+
+    def save(self, path):
+        fingerprints = array("Q", sorted(self.fingerprints))
+        if sys.byteorder != "little":
+            fingerprints.byteswap()
+        directory = os.path.dirname(path) or "."
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temporary, 0o666 & ~umask)
+            with os.fdopen(descriptor, "wb") as baseline:
+                baseline.write(self.MAGIC)
+                baseline.write(fingerprints.tobytes())
+            os.replace(temporary, path)
+        except OSError as error:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            sys.stderr.write(f"{path}: {error.strerror}\n")
+            sys.exit()
+
+
+def jobs_count(value):
+    if value == "auto":
+        return os.cpu_count() or 1
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected 'auto' or a positive integer, got {value!r}"
+        )
+    return jobs
+
+
+def shard_spec(value):
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        index = count = 0
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"expected i/N with 1 <= i <= N, got {value!r}"
+        )
+    return index, count
+
+
+def rule_codes(value):
+    return [code.strip().upper() for code in value.split(",") if code.strip()]
+
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(
         description="This program statically analyzes python code in a single "
-                    "file or in multiple files in a single directory given as "
-                    "a command line argument."
+                    "file or in all the files of a directory tree given as a "
+                    "command line argument."
     )
-    parser.add_argument("file_or_directory",
+    parser.add_argument("file_or_directory", nargs="?",
                         help="Enter the name of the python file or the "
                              "directory in which the python code file or files"
                              " are to be found."
                         )
-    f_or_d = parser.parse_args().file_or_directory
+    parser.add_argument("-j", "--jobs", type=jobs_count, default="auto",
+                        help="Number of processes used to analyze the files, "
+                             "'auto' uses one process per CPU."
+                        )
+    parser.add_argument("--read-ahead", type=int, default=0, metavar="N",
+                        help="Read the next N files in background threads "
+                             "while a file is analyzed, when the files are "
+                             "analyzed in a single process."
+                        )
+    parser.add_argument("--read-ahead-memory", type=int,
+                        default=READ_AHEAD_MEMORY, metavar="MIB",
+                        help="Maximum size in MiB of the files read ahead."
+                        )
+    parser.add_argument("--cache-dir",
+                        help="Directory in which the results of analyzed files "
+                             "are cached by content, so unchanged files are "
+                             "not analyzed again."
+                        )
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help="Maximum size of the cache directory in MiB, the "
+                             "least recently used entries are evicted first."
+                        )
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="Print the cache hit and miss counts to stderr."
+                        )
+    parser.add_argument("--incremental", action="store_true",
+                        help="Record the modification time, size and inode "
+                             "of every analyzed file in the cache directory "
+                             "and reuse the cached results of files whose "
+                             "record is unchanged without reading them."
+                        )
+    parser.add_argument("--diff", metavar="BASE",
+                        help="Analyze only the files changed since the git "
+                             "revision BASE and report only the issues on "
+                             "the changed lines."
+                        )
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running after the first analysis and "
+                             "print the issues that appear (+) or disappear "
+                             "(-) whenever a python file changes."
+                        )
+    parser.add_argument("--shard", type=shard_spec, metavar="I/N",
+                        help="Analyze only the I-th of N disjoint parts of "
+                             "the files, chosen by a hash of their path."
+                        )
+    parser.add_argument("--shard-weight", choices=("count", "size"),
+                        default="count",
+                        help="Balance the shards by the number of files "
+                             "(the default) or by their total size."
+                        )
+    parser.add_argument("--merge", nargs="+", metavar="NDJSON",
+                        help="Merge the NDJSON outputs of the shards of a run "
+                             "into the order of an unsharded run."
+                        )
+    parser.add_argument("--serve", metavar="SOCKET",
+                        help="Run as a server listening on the Unix socket "
+                             "SOCKET for requests of analyzer_client.py."
+                        )
+    parser.add_argument("--timeout", type=float, default=TIMEOUT,
+                        metavar="SECONDS",
+                        help="Stop analyzing a file after SECONDS and report "
+                             "it with E002, 0 disables the limit."
+                        )
+    parser.add_argument("--engine", choices=tuple(ENGINES), default="python",
+                        help="How the files are read: 'mmap' maps every file "
+                             "and checks S001, S002, S003 and S006 on its "
+                             "bytes instead of its decoded lines, 'numpy' "
+                             "checks S001, S002 and S006 with vectorized "
+                             "operations on its bytes if NumPy is installed."
+                        )
+    parser.add_argument("--format", choices=tuple(FORMATTERS),
+                        help="Output format of the issues, text by default."
+                        )
+    parser.add_argument("--stdin-jsonl", action="store_true",
+                        help="Analyze the sources of the JSON records "
+                             '{"path": ..., "source": ...} read line by line '
+                             "from stdin and print the issues as NDJSON."
+                        )
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="Report only the issues that are not recorded "
+                             "in the baseline FILE."
+                        )
+    parser.add_argument("--write-baseline", metavar="FILE",
+                        help="Record every issue found in the baseline FILE "
+                             "instead of reporting it."
+                        )
+    parser.add_argument("--select", type=rule_codes, metavar="CODES",
+                        help="Comma separated list of rule codes or code "
+                             "prefixes to check, all rules by default."
+                        )
+    parser.add_argument("--ignore", type=rule_codes, metavar="CODES",
+                        help="Comma separated list of rule codes or code "
+                             "prefixes not to check."
+                        )
+    parser.add_argument("--profile-rules", action="store_true",
+                        help="Print the time spent in every phase and rule "
+                             "to stderr at the end of the run."
+                        )
+    parser.add_argument("--profile-format", choices=("table", "json"),
+                        default="table",
+                        help="Format of the --profile-rules report."
+                        )
+    args = parser.parse_args(argv)
+    try:
+        args.rules = select_rules(args.select, args.ignore)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.serve and not hasattr(socketserver, "ForkingMixIn"):
+        parser.error("--serve is not supported on this platform")
+    if args.stdin_jsonl:
+        if args.file_or_directory is not None:
+            parser.error("--stdin-jsonl does not take a file or directory")
+        if args.format not in (None, "ndjson"):
+            parser.error("--stdin-jsonl only supports the ndjson format")
+        if args.diff or args.watch or args.incremental:
+            parser.error("--stdin-jsonl cannot be combined with --diff, "
+                         "--watch or --incremental")
+        args.format = "ndjson"
+    elif args.merge:
+        if args.file_or_directory is not None:
+            parser.error("--merge does not take a file or directory")
+    elif args.file_or_directory is None and not args.serve:
+        parser.error("the following arguments are required: file_or_directory")
+    args.format = args.format or "text"
+    if args.timeout < 0:
+        parser.error("--timeout must not be negative")
+    if args.read_ahead < 0:
+        parser.error("--read-ahead must not be negative")
+    if args.incremental and not args.cache_dir:
+        parser.error("--incremental requires --cache-dir")
+    if args.watch and args.shard:
+        parser.error("--watch cannot be combined with --shard")
+    if args.watch and args.diff:
+        parser.error("--watch cannot be combined with --diff")
+    if args.watch and args.format != "text":
+        parser.error("--watch only supports the text format")
+    if args.watch and (args.baseline or args.write_baseline):
+        parser.error("--watch cannot be combined with a baseline")
+    return args
+
+
+def walk_directory(directory, recursive=True):
+    try:
+        with os.scandir(directory) as scanner:
+            entries = sorted(scanner, key=lambda entry: entry.name)
+    except OSError as error:
+        sys.stderr.write(f'{directory}: {error.strerror}\n')
+        return
+    subdirectories = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirectories.append(entry.path)
+        elif entry.name.endswith(".py") and entry.is_file():
+            yield entry.path
+    if recursive:
+        for subdirectory in subdirectories:
+            yield from walk_directory(subdirectory)
+
+
+def get_filenames(f_or_d):
     if not os.access(f_or_d, os.F_OK):
         sys.stderr.write(f'{f_or_d} does not exist.\n')
         sys.exit()
     elif os.path.isdir(f_or_d):
-        f_and_d = sorted(os.listdir(f_or_d))
-        return [os.path.join(f_or_d, f) for f in f_and_d if f.endswith(".py")]
+        return walk_directory(f_or_d)
     elif os.path.isfile(f_or_d):
         if f_or_d.endswith(".py"):
             return [f_or_d]
@@ -215,15 +1223,883 @@ def get_filenames():
             sys.exit()
 
 
-def main():
-    issues = []
-    for filename in get_filenames():
-        with open(filename, "r", encoding="utf-8") as source:
-            source_code = source.read()
-        sca = StaticCodeAnalyzer(filename, source_code)
-        issues.extend(sca.issues)
-    for issue in issues:
-        print(issue)
+def walk_order(path):
+    *directories, filename = os.path.normpath(path).split(os.sep)
+    return (*((1, directory) for directory in directories), (0, filename))
+
+
+def shard_key(filename, root):
+    path = os.path.relpath(filename, root).replace(os.sep, "/")
+    key = hashlib.blake2b(path.encode("utf-8", "surrogateescape"),
+                          digest_size=8)
+    return int.from_bytes(key.digest(), "big")
+
+
+def shard_filenames(filenames, root, shard, weight="count"):
+    index, count = shard
+    if weight == "count":
+        return (filename for filename in filenames
+                if shard_key(filename, root) % count == index - 1)
+    files = []
+    for filename in filenames:
+        try:
+            size = os.stat(filename).st_size
+        except OSError:
+            size = 0
+        files.append((-size, shard_key(filename, root), filename))
+    loads = [(0, shard_index) for shard_index in range(count)]
+    selected = set()
+    for size, _, filename in sorted(files):
+        load, shard_index = heapq.heappop(loads)
+        if shard_index == index - 1:
+            selected.add(filename)
+        heapq.heappush(loads, (load - size, shard_index))
+    return [filename for _, _, filename in files if filename in selected]
+
+
+def merge_outputs(paths, out):
+    def keyed(path, lines):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                key = walk_order(json.loads(line)["path"])
+            except (ValueError, KeyError, TypeError):
+                sys.stderr.write(f"{path}: line {number} is not an issue "
+                                 f"record.\n")
+                sys.exit()
+            yield key, line if line.endswith("\n") else line + "\n"
+
+    shards = []
+    try:
+        for path in paths:
+            try:
+                shards.append(open(path, "r", encoding="utf-8"))
+            except OSError as error:
+                sys.stderr.write(f"{path}: {error.strerror}\n")
+                sys.exit()
+        merged = heapq.merge(*(keyed(path, shard)
+                               for path, shard in zip(paths, shards)),
+                             key=lambda item: item[0])
+        for _, line in merged:
+            out.write(line)
+    finally:
+        for shard in shards:
+            shard.close()
+
+
+def get_changed_lines(base, f_or_d):
+    if os.path.isdir(f_or_d):
+        directory, pathspec = f_or_d, "."
+    else:
+        directory, pathspec = os.path.split(f_or_d)
+    command = ["git", "-C", directory or ".", "diff", "--no-color",
+               "--no-ext-diff", "--relative", "--diff-filter=ACMR", base]
+
+    def git(*arguments, **options):
+        import subprocess
+        try:
+            completed = subprocess.run([*command, *arguments, "--", pathspec],
+                                       capture_output=True, **options)
+        except OSError as error:
+            sys.stderr.write(f'git could not be run: {error}\n')
+            sys.exit()
+        if completed.returncode:
+            sys.stderr.write(os.fsdecode(completed.stderr))
+            sys.exit()
+        return completed.stdout
+
+    names = iter(os.fsdecode(name) for name
+                 in git("--name-only", "-z").split(b"\0") if name)
+    diff = git("--unified=0", text=True, encoding="utf-8", errors="replace")
+    changed_lines = {}
+    lines = None
+    for line in diff.split("\n"):
+        if line.startswith("diff --git "):
+            path = next(names)
+            lines = None
+            if path.endswith(".py"):
+                if os.path.isdir(f_or_d):
+                    path = os.path.join(f_or_d, *path.split("/"))
+                else:
+                    path = f_or_d
+                lines = changed_lines.setdefault(path, set())
+        elif lines is not None and line.startswith("@@"):
+            hunk = PATTERNS["hunk"].match(line)
+            if hunk:
+                start = int(hunk.group(1))
+                length = int(hunk.group(2) or 1)
+                lines.update(range(start, start + length))
+    return changed_lines
+
+
+@contextmanager
+def open_source(filename, engine="python", profiler=None):
+    with open(filename, "rb") as source:
+        with timing(profiler, "read"):
+            stat = Manifest.stat_key(os.fstat(source.fileno()))
+            if engine == "mmap" and stat[1]:
+                data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = source.read()
+        if isinstance(data, bytes):
+            yield stat, data
+            return
+        with data:
+            yield stat, data
+
+
+def analyze_source(filename, stat, data, profiler=None,
+                   options=AnalysisOptions()):
+    cache = options.cache
+    digest = None
+    if cache is not None:
+        with timing(profiler, "cache"):
+            digest = cache.digest(data)
+            records = cache.get(digest)
+        if records is not None:
+            fingerprints = None
+            if options.fingerprint:
+                with timing(profiler, "baseline"):
+                    fingerprints = Baseline.fingerprint(
+                        filename, records, str(data, "utf-8", "replace")
+                    )
+            return FileResult(filename, records, True, digest, stat,
+                              profiler, fingerprints)
+    code, records = analyzer_for(options).check_isolated(data, profiler)
+    if any(record[1] in TRANSIENT_ERRORS for record in records):
+        digest = None
+    elif cache is not None:
+        with timing(profiler, "cache"):
+            cache.put(digest, records)
+    fingerprints = None
+    if options.fingerprint:
+        with timing(profiler, "baseline"):
+            if code is None:
+                code = str(data, "utf-8", "replace")
+            fingerprints = Baseline.fingerprint(filename, records, code)
+    return FileResult(filename, records, False, digest, stat, profiler,
+                      fingerprints)
+
+
+def read_error(filename, error, profiler=None):
+    return FileResult(filename, [(1, "E004", error.strerror or str(error))],
+                      False, profile=profiler)
+
+
+def analyze_file(filename, options=AnalysisOptions(), source=None):
+    profiler = Profiler() if options.profile else None
+    if source is None:
+        source = open_source(filename, options.engine, profiler)
+    else:
+        source = nullcontext(source)
+    try:
+        with source as (stat, data):
+            return analyze_source(filename, stat, data, profiler, options)
+    except OSError as error:
+        return read_error(filename, error, profiler)
+
+
+def analyze_batch(filenames, options=AnalysisOptions()):
+    return [analyze_file(filename, options) for filename in filenames]
+
+
+def recover_batch(filenames, options=AnalysisOptions()):
+    from concurrent.futures.process import (BrokenProcessPool,
+                                            ProcessPoolExecutor)
+    results = []
+    executor = ProcessPoolExecutor(1)
+    try:
+        for filename in filenames:
+            try:
+                results.extend(executor.submit(
+                    analyze_batch, [filename], options
+                ).result())
+            except BrokenProcessPool as error:
+                results.append(FileResult(filename, [
+                    (1, "E005", f"{type(error).__name__}: {error}")
+                ], False))
+                executor.shutdown()
+                executor = ProcessPoolExecutor(1)
+    finally:
+        executor.shutdown()
+    return results
+
+
+def find_unchanged(filename, cache, manifest, fingerprint=False):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    digest = manifest.unchanged(filename, stat)
+    if digest is None:
+        return None
+    records = cache.get(digest)
+    if records is None:
+        return None
+    fingerprints = None
+    if fingerprint:
+        try:
+            with open(filename, "r", encoding="utf-8") as source:
+                fingerprints = Baseline.fingerprint(filename, records,
+                                                    source.read())
+        except (OSError, ValueError):
+            return None
+    return FileResult(filename, records, True, digest, Manifest.stat_key(stat),
+                      fingerprints=fingerprints)
+
+
+class ReadAhead:
+    def __init__(self, depth, memory=READ_AHEAD_MEMORY):
+        self.depth = depth
+        self.memory = memory * 1024 * 1024
+        self.used = 0
+        self.waiting_for = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def reserve(self, index, size):
+        with self.condition:
+            self.condition.wait_for(lambda: (
+                self.closed or index == self.waiting_for
+                or self.used + size <= self.memory
+            ))
+            self.used += size
+
+    def release(self, size, consumed=0):
+        with self.condition:
+            self.used -= size
+            self.waiting_for += consumed
+            self.condition.notify_all()
+
+    def load(self, index, filename, unchanged):
+        result = unchanged(filename)
+        if result is not None:
+            return result
+        try:
+            with open(filename, "rb") as source:
+                stat = Manifest.stat_key(os.fstat(source.fileno()))
+                self.reserve(index, stat[1])
+                try:
+                    data = source.read()
+                except BaseException:
+                    self.release(stat[1])
+                    raise
+        except OSError as error:
+            return read_error(filename, error)
+        return stat, data
+
+    def sources(self, filenames, unchanged):
+        executor = ThreadPoolExecutor(self.depth)
+        try:
+            pending = deque()
+            for index, filename in enumerate(filenames):
+                pending.append((filename, executor.submit(
+                    self.load, index, filename, unchanged
+                )))
+                while len(pending) > self.depth:
+                    yield from self.take(*pending.popleft())
+            while pending:
+                yield from self.take(*pending.popleft())
+        finally:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+            executor.shutdown(cancel_futures=True)
+
+    def take(self, filename, future):
+        source = future.result()
+        yield filename, source
+        size = 0 if isinstance(source, FileResult) else source[0][1]
+        self.release(size, 1)
+
+
+def analyze_files(filenames, jobs=1, options=AnalysisOptions(), manifest=None,
+                  read_ahead=None):
+    def unchanged(filename):
+        if manifest is None:
+            return None
+        return find_unchanged(filename, options.cache, manifest,
+                              options.fingerprint)
+
+    if jobs == 1 and read_ahead is not None:
+        for filename, source in read_ahead.sources(filenames, unchanged):
+            if isinstance(source, FileResult):
+                yield source
+            else:
+                yield analyze_file(filename, options, source)
+        return
+    if jobs == 1:
+        for filename in filenames:
+            yield unchanged(filename) or analyze_file(filename, options)
+        return
+    from concurrent.futures.process import (BrokenProcessPool,
+                                            ProcessPoolExecutor)
+    executor = ProcessPoolExecutor(jobs)
+
+    def submit(batch):
+        nonlocal executor
+        try:
+            return batch, executor.submit(analyze_batch, batch, options)
+        except BrokenProcessPool:
+            executor.shutdown()
+            executor = ProcessPoolExecutor(jobs)
+            return batch, executor.submit(analyze_batch, batch, options)
+
+    def collect(batch, future):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            return recover_batch(batch, options)
+
+    try:
+        pending = deque()
+        batch = []
+        for filename in filenames:
+            result = unchanged(filename)
+            if result is None:
+                batch.append(filename)
+                if len(batch) < BATCH_SIZE:
+                    continue
+            if batch:
+                pending.append(submit(batch))
+                batch = []
+            if result is not None:
+                pending.append(([], Future()))
+                pending[-1][1].set_result([result])
+            while len(pending) > 2 * jobs:
+                yield from collect(*pending.popleft())
+        if batch:
+            pending.append(submit(batch))
+        while pending:
+            yield from collect(*pending.popleft())
+    finally:
+        executor.shutdown()
+
+
+def read_lines(stream, out=None):
+    try:
+        descriptor = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        for line in getattr(stream, "buffer", stream):
+            yield line
+        return
+    buffer = bytearray()
+    searched = 0
+    while True:
+        if out is not None:
+            try:
+                idle = not select.select([descriptor], [], [], 0)[0]
+            except (OSError, ValueError):
+                idle = True
+            if idle:
+                out.flush()
+        chunk = os.read(descriptor, INPUT_CHUNK)
+        if not chunk:
+            break
+        buffer += chunk
+        start = 0
+        end = buffer.find(b"\n", searched)
+        while end > -1:
+            yield bytes(buffer[start:end])
+            start = end + 1
+            end = buffer.find(b"\n", start)
+        del buffer[:start]
+        searched = len(buffer)
+    if buffer:
+        yield bytes(buffer)
+
+
+def analyze_stream(stream, options=AnalysisOptions(), out=None):
+    for number, line in enumerate(read_lines(stream, out), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            path, source = record["path"], record["source"]
+            if not isinstance(path, str) or not isinstance(source, str):
+                raise TypeError("path and source must be strings")
+        except (ValueError, KeyError, TypeError) as error:
+            message = f"missing {error}" if isinstance(error, KeyError) else error
+            yield FileResult("<stdin>", [(number, "E006", str(message))], False)
+            continue
+        profiler = Profiler() if options.profile else None
+        data = source.encode("utf-8", "surrogatepass")
+        yield analyze_source(path, None, data, profiler, options)
+
+
+class TextFormatter:
+    def header(self):
+        return ""
+
+    def format(self, filename, records):
+        return "".join(f"{Issue(filename, line_number, error)}\n"
+                       for line_number, *error in records)
+
+    def footer(self):
+        return ""
+
+
+class NdjsonFormatter(TextFormatter):
+    @staticmethod
+    def issue(filename, line_number, code, *name):
+        issue = {
+            "path": filename,
+            "line": line_number,
+            "code": code,
+            "message": Issue.error_codes[code].format(*name),
+        }
+        if name:
+            issue["name"] = name[0]
+        return issue
+
+    def format(self, filename, records):
+        return "".join(json.dumps(self.issue(filename, *record)) + "\n"
+                       for record in records)
+
+
+class JsonFormatter(NdjsonFormatter):
+    def __init__(self):
+        self.separator = "\n"
+
+    def header(self):
+        return "["
+
+    def format(self, filename, records):
+        parts = []
+        for record in records:
+            parts.append(self.separator)
+            parts.append(json.dumps(self.issue(filename, *record)))
+            self.separator = ",\n"
+        return "".join(parts)
+
+    def footer(self):
+        return "\n]\n" if self.separator != "\n" else "]\n"
+
+
+class SarifFormatter(JsonFormatter):
+    def header(self):
+        driver = {
+            "name": "code_analyzer",
+            "version": __version__,
+            "rules": [{"id": code, "shortDescription": {"text": message}}
+                      for code, message in Issue.error_codes.items()],
+        }
+        return ('{"$schema": "https://json.schemastore.org/sarif-2.1.0.json", '
+                '"version": "2.1.0", "runs": [{"tool": {"driver": '
+                f'{json.dumps(driver)}}}, "results": [')
+
+    @staticmethod
+    def issue(filename, line_number, code, *name):
+        import urllib.parse
+        uri = urllib.parse.quote(filename.replace(os.sep, "/"))
+        return {
+            "ruleId": code,
+            "level": "error" if code.startswith("E") else "warning",
+            "message": {"text": Issue.error_codes[code].format(*name)},
+            "locations": [{"physicalLocation": {
+                "artifactLocation": {"uri": uri},
+                "region": {"startLine": line_number},
+            }}],
+        }
+
+    def footer(self):
+        return "\n]}]}\n"
+
+
+FORMATTERS = {
+    "text": TextFormatter,
+    "ndjson": NdjsonFormatter,
+    "json": JsonFormatter,
+    "sarif": SarifFormatter,
+}
+
+
+def open_output(stream):
+    try:
+        descriptor = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return stream
+    if stream.isatty():
+        return stream
+    stream.flush()
+    return io.TextIOWrapper(
+        io.BufferedWriter(io.FileIO(descriptor, "w", closefd=False),
+                          OUTPUT_BUFFER),
+        encoding=stream.encoding, errors=stream.errors,
+    )
+
+
+def report(formatter, filename, records, out, profiler=None):
+    with timing(profiler, "formatting"):
+        text = formatter.format(filename, records)
+    with timing(profiler, "output"):
+        out.write(text)
+
+
+class InotifyWatcher:
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+            | IN_DELETE | IN_DELETE_SELF)
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory, recursive=True):
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.descriptor = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.descriptor < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        self.directory = directory
+        self.recursive = recursive
+        self.add_directory(directory)
+
+    def add_directory(self, directory):
+        watch = self.libc.inotify_add_watch(
+            self.descriptor, os.fsencode(directory), self.MASK
+        )
+        if watch < 0:
+            return []
+        self.directories[watch] = directory
+        created = []
+        try:
+            with os.scandir(directory) as scanner:
+                for entry in scanner:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive:
+                            created.extend(self.add_directory(entry.path))
+                    elif entry.name.endswith(".py"):
+                        created.append(entry.path)
+        except OSError:
+            pass
+        return created
+
+    def read(self, timeout):
+        if not select.select([self.descriptor], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.descriptor, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                changed.update(walk_directory(self.directory, self.recursive))
+                continue
+            if mask & self.IN_IGNORED:
+                self.directories.pop(watch, None)
+                continue
+            directory = self.directories.get(watch)
+            if directory is None:
+                continue
+            if mask & self.IN_DELETE_SELF:
+                self.remove_directory(directory)
+                changed.add(directory)
+                continue
+            if not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if not self.recursive:
+                    continue
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    changed.update(self.add_directory(path))
+                else:
+                    self.remove_directory(path)
+                    changed.add(path)
+            elif name.endswith(".py"):
+                changed.add(path)
+        return changed
+
+    def remove_directory(self, directory):
+        prefix = os.path.join(directory, "")
+        for watch, path in list(self.directories.items()):
+            if path == directory or path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.descriptor, watch)
+                del self.directories[watch]
+
+    def close(self):
+        os.close(self.descriptor)
+
+
+class PollingWatcher:
+    def __init__(self, directory, recursive=True):
+        self.directory = directory
+        self.recursive = recursive
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        snapshot = {}
+        for filename in walk_directory(self.directory, self.recursive):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            snapshot[filename] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        return snapshot
+
+    def read(self, timeout):
+        time.sleep(timeout)
+        snapshot = self.take_snapshot()
+        changed = {filename for filename in snapshot.keys() | self.snapshot.keys()
+                   if snapshot.get(filename) != self.snapshot.get(filename)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(directory, recursive=True):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory, recursive)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(directory, recursive)
+
+
+def wait_for_changes(watcher):
+    changed = set()
+    while not changed:
+        changed = watcher.read(WATCH_POLL_INTERVAL)
+    while more := watcher.read(WATCH_DEBOUNCE):
+        changed |= more
+    return changed
+
+
+def difference(records, other_records):
+    remaining = Counter(records) - Counter(other_records)
+    for record in records:
+        if remaining[record]:
+            remaining[record] -= 1
+            yield record
+
+
+def removed_files(changed, results):
+    files = set()
+    for path in changed:
+        if path in results or os.path.isfile(path):
+            files.add(path)
+            continue
+        prefix = os.path.join(path, "")
+        inside = {filename for filename in results if filename.startswith(prefix)}
+        files.update(inside or {path})
+    return files
+
+
+def watch(f_or_d, results, options=AnalysisOptions(), out=None):
+    out = out or sys.stdout
+    if os.path.isdir(f_or_d):
+        directory = f_or_d
+    else:
+        directory = os.path.dirname(f_or_d) or "."
+    watcher = make_watcher(directory, os.path.isdir(f_or_d))
+    try:
+        while True:
+            changed = wait_for_changes(watcher)
+            if not os.path.isdir(f_or_d):
+                target = os.path.normpath(f_or_d)
+                changed = {f_or_d for path in changed
+                           if os.path.normpath(path) == target}
+            changed = removed_files(changed, results)
+            for filename in sorted(changed, key=lambda path: walk_order(
+                    os.path.relpath(path, directory))):
+                old_records = results.get(filename, [])
+                if os.path.isfile(filename):
+                    records = analyze_file(filename, options).records
+                    results[filename] = records
+                else:
+                    records = []
+                    results.pop(filename, None)
+                out.writelines(f"- {Issue(filename, line_number, error)}\n"
+                               for line_number, *error
+                               in difference(old_records, records))
+                out.writelines(f"+ {Issue(filename, line_number, error)}\n"
+                               for line_number, *error
+                               in difference(records, old_records))
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+class FrameWriter(io.RawIOBase):
+    def __init__(self, stream, channel):
+        self.stream = stream
+        self.channel = channel
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        analyzer_client.write_frame(self.stream, self.channel, bytes(data))
+        return len(data)
+
+
+class AnalysisRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        cwd, stdout_encoding, stderr_encoding, *argv = (
+            analyzer_client.read_request(self.rfile)
+        )
+        if self.server.cache_dir and "--cache-dir" not in argv:
+            argv += ["--cache-dir", self.server.cache_dir]
+        sys.stdout = io.TextIOWrapper(
+            FrameWriter(self.wfile, analyzer_client.STDOUT),
+            encoding=stdout_encoding,
+        )
+        sys.stderr = io.TextIOWrapper(
+            FrameWriter(self.wfile, analyzer_client.STDERR),
+            encoding=stderr_encoding, errors="backslashreplace",
+            write_through=True,
+        )
+        try:
+            os.chdir(cwd)
+            if "--stdin-jsonl" in argv:
+                sys.exit("--stdin-jsonl is not supported by the server")
+            main(argv)
+            status = 0
+        except SystemExit as exit_:
+            if exit_.code is None or isinstance(exit_.code, int):
+                status = exit_.code or 0
+            else:
+                sys.stderr.write(f"{exit_.code}\n")
+                status = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        analyzer_client.write_frame(self.wfile, analyzer_client.EXIT,
+                                    str(status).encode())
+
+
+def serve(socket_path, cache_dir=None):
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(mode):
+            sys.stderr.write(f"{socket_path} exists and is not a socket.\n")
+            sys.exit()
+        os.remove(socket_path)
+
+    class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        pass
+
+    with Server(socket_path, AnalysisRequestHandler) as server:
+        server.cache_dir = cache_dir
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    if args.serve:
+        serve(args.serve, args.cache_dir)
+        return
+    if args.merge:
+        out = open_output(sys.stdout)
+        try:
+            merge_outputs(args.merge, out)
+        finally:
+            out.flush()
+        return
+    changed_lines = None
+    if not args.stdin_jsonl:
+        filenames = get_filenames(args.file_or_directory)
+        if args.diff:
+            changed_lines = get_changed_lines(args.diff,
+                                              args.file_or_directory)
+            filenames = sorted(changed_lines, key=lambda filename: walk_order(
+                os.path.relpath(filename, args.file_or_directory)
+            ))
+        if args.shard:
+            filenames = shard_filenames(filenames, args.file_or_directory,
+                                        args.shard, args.shard_weight)
+        jobs = args.jobs if os.path.isdir(args.file_or_directory) else 1
+    cache = manifest = None
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir, args.rules, args.cache_size)
+    if args.incremental:
+        manifest = Manifest(os.path.join(args.cache_dir, "manifest"))
+    baseline = Baseline(args.baseline) if args.baseline else None
+    new_baseline = Baseline() if args.write_baseline else None
+    profiler = Profiler() if args.profile_rules else None
+    options = AnalysisOptions(cache, args.rules, args.profile_rules,
+                              bool(args.baseline or args.write_baseline),
+                              args.engine, args.timeout)
+    read_ahead = None
+    if args.read_ahead:
+        read_ahead = ReadAhead(args.read_ahead, args.read_ahead_memory)
+    formatter = FORMATTERS[args.format]()
+    out = open_output(sys.stdout)
+    if args.stdin_jsonl:
+        file_results = analyze_stream(sys.stdin, options, out)
+    else:
+        file_results = analyze_files(filenames, jobs, options, manifest,
+                                     read_ahead)
+    results = {}
+    try:
+        out.write(formatter.header())
+        for result in file_results:
+            if result.profile is not None:
+                profiler.merge(result.profile)
+            if args.watch:
+                results[result.filename] = result.records
+            records = result.records
+            fingerprints = result.fingerprints
+            if fingerprints is None and options.fingerprint:
+                fingerprints = Baseline.fingerprint(result.filename, records, "")
+            if changed_lines is not None:
+                lines = changed_lines[result.filename]
+                changed = [record[0] in lines or record[1] in FILE_ERRORS
+                           for record in records]
+                records = [record for record, keep in zip(records, changed)
+                           if keep]
+                if fingerprints is not None:
+                    fingerprints = [fingerprint for fingerprint, keep
+                                    in zip(fingerprints, changed) if keep]
+            if new_baseline is not None:
+                new_baseline.add(fingerprints)
+                records = []
+            elif baseline is not None:
+                records = baseline.new_records(records, fingerprints)
+            report(formatter, result.filename, records, out, profiler)
+            if cache is not None:
+                cache.hits += result.cached
+                cache.misses += not result.cached
+            if manifest is not None and result.stat is not None:
+                manifest.update(result.filename, result.stat, result.digest)
+        out.write(formatter.footer())
+    finally:
+        out.flush()
+    if new_baseline is not None:
+        new_baseline.save(args.write_baseline)
+    if manifest is not None:
+        manifest.save()
+    if cache is not None:
+        cache.evict()
+        if args.cache_stats:
+            sys.stderr.write(cache.statistics() + "\n")
+    if profiler is not None:
+        sys.stderr.write(profiler.report(args.profile_format))
+    if args.watch:
+        watch(args.file_or_directory, results, options, out)
 
 
 if __name__ == '__main__':